@@ -1,18 +1,32 @@
-from flask import Flask, render_template, request, redirect, url_for, flash,jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash,jsonify, Response, stream_with_context, has_request_context, g
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, Integer, Float, Text, Date, DateTime, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column, relationship, raiseload, Session
+from sqlalchemy import String, Integer, Float, Text, Date, DateTime, ForeignKey, Index, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
 from flask_login import UserMixin, login_user, LoginManager, current_user, logout_user, login_required
 from werkzeug.security import generate_password_hash, check_password_hash
 from email.message import EmailMessage
-from datetime import datetime,date
+from datetime import datetime,date,timedelta
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from groq import Groq
+from refdata import store as refdata
+from ratelimit import RateLimiter, SQLiteBackend
+from functools import wraps
+import click
 import urllib.parse
+import threading
+import bisect
+import math
+import time
+import csv
+import io
 import requests
 import smtplib
 import hashlib
 import json
+import re
 import os
 
 load_dotenv()
@@ -24,8 +38,9 @@ def gravatar_url(email, size=180, default="retro"):
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get("SECRET_KEY")
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///travelplanner.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URL", 'sqlite:///travelplanner.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['QUERY_GUARD'] = os.getenv("QUERY_GUARD") == "1"
 app.jinja_env.globals.update(gravatar_url=gravatar_url)
 
 db = SQLAlchemy(app)
@@ -34,41 +49,95 @@ client = Groq(api_key=os.getenv("GROQ_API_KEY"))
 login_manager = LoginManager()
 login_manager.init_app(app)
 
-CITY_TO_COUNTRY = {
-    "paris": "france",
-    "london": "uk",
-    "dubai": "uae",
-    "rome": "italy",
-    "tokyo": "japan",
-    "new york": "usa",
-    "goa": "india",
-    "delhi": "india",
-    "mumbai": "india",
-    "bali": "indonesia"
+PREFETCH_MAX_JOBS = int(os.getenv("PREFETCH_MAX_JOBS", 2))
+PREFETCH_MAX_QUEUE = int(os.getenv("PREFETCH_MAX_QUEUE", 20))
+PREFETCH_DAILY_CALLS = int(os.getenv("PREFETCH_DAILY_CALLS", 200))
+PREFETCH_DEFAULT_NIGHTS = 3
+PREFETCH_LEAD_DAYS = 30
+PREFETCH_TTL = timedelta(hours=6)
+
+prefetch_executor = ThreadPoolExecutor(max_workers=PREFETCH_MAX_JOBS, thread_name_prefix="prefetch")
+prefetch_lock = threading.Lock()
+prefetch_cache = {}
+prefetch_pending = set()
+prefetch_spend = {"day": date.today(), "calls": 0}
+
+EXPORT_MIMETYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "ics": "text/calendar"
 }
 
-COUNTRY_CURRENCY = {
-    "india": {"symbol": "₹", "inr_per_unit": 1.0},
-    "france": {"symbol": "€", "inr_per_unit": 90.0},
-    "uk": {"symbol": "£", "inr_per_unit": 105.0},
-    "usa": {"symbol": "$", "inr_per_unit": 83.0},
-    "uae": {"symbol": "AED", "inr_per_unit": 23.0},
-    "japan": {"symbol": "¥", "inr_per_unit": 0.58},
-    "italy": {"symbol": "€", "inr_per_unit": 90.0},
-    "indonesia": {"symbol": "Rp", "inr_per_unit": 0.0055}
+TRIP_EXPORT_FIELDS = ["destination", "start_date", "end_date", "budget", "notes"]
+WISHLIST_EXPORT_FIELDS = ["destination", "image", "created_at"]
+
+FREE_WINDOW_DEFAULT_NIGHTS = 3
+FREE_WINDOW_MAX_HORIZON = 730
+FREE_WINDOW_MAX_RESULTS = 50
+
+RATE_LIMITS = {
+    "itinerary": {"user": (5, 60), "global": (60, 60)},
+    "explore": {"user": (10, 60), "global": (120, 60)},
+    "search": {"user": (30, 60), "global": (300, 60)}
 }
 
-COUNTRY_COST_BASIS = {
-    "india": {"hotel": 2500, "meal": 700, "transport": 300, "activity": 500},
-    "france": {"hotel": 100, "meal": 18, "transport": 12, "activity": 18},
-    "uk": {"hotel": 110, "meal": 20, "transport": 10, "activity": 22},
-    "usa": {"hotel": 130, "meal": 22, "transport": 15, "activity": 25},
-    "uae": {"hotel": 120, "meal": 25, "transport": 14, "activity": 24},
-    "japan": {"hotel": 14000, "meal": 2000, "transport": 800, "activity": 2500},
-    "italy": {"hotel": 110, "meal": 20, "transport": 12, "activity": 20},
-    "indonesia": {"hotel": 450000, "meal": 90000, "transport": 25000, "activity": 80000}
+if os.getenv("RATE_LIMIT_BACKEND") == "sqlite":
+    rate_limiter = RateLimiter(RATE_LIMITS, SQLiteBackend(os.getenv("RATE_LIMIT_DB", "ratelimit.db")))
+else:
+    rate_limiter = RateLimiter(RATE_LIMITS)
+
+LLM_MODEL = "llama-3.1-8b-instant"
+
+def llm_max_tokens(route, default):
+    return int(os.getenv(f"LLM_MAX_TOKENS_{route.upper()}", default))
+
+LLM_ROUTES = {
+    "resolve_city": {"max_tokens": llm_max_tokens("resolve_city", 20), "temperature": 0.0, "max_prompt_tokens": 200},
+    "explore": {"max_tokens": llm_max_tokens("explore", 600), "temperature": 0.7, "max_prompt_tokens": 300},
+    "itinerary": {"max_tokens": llm_max_tokens("itinerary", 1500), "temperature": 0.4, "max_prompt_tokens": 400}
 }
 
+LLM_PRICING = {
+    "llama-3.1-8b-instant": {"prompt": 0.05, "completion": 0.08}
+}
+
+DEFAULT_QUERY_BUDGET = 3
+QUERY_BUDGETS = {
+    "static": 0,
+    "metrics": 0,
+    "home": 2,
+    "login": 2,
+    "register": 3,
+    "logout": 1,
+    "dashboard": 3,
+    "my_trips": 3,
+    "trip_details": 3,
+    "create_trip": 3,
+    "edit_trip": 5,
+    "delete_trip": 3,
+    "save_itinerary": 3,
+    "explore": 3,
+    "itinerary": 3,
+    "free_windows": 2,
+    "search_destination": 1,
+    "wishlist": 3,
+    "add_to_wishlist": 3,
+    "remove_wishlist": 3,
+    "remove_wishlist_get": 3,
+    "undo_wishlist": 3,
+    "export_trips": 2,
+    "export_wishlist": 2,
+    "import_trips": None,
+    "profile": 2,
+    "edit_profile": 2,
+    "help": 2,
+    "about": 2,
+    "contact": 2
+}
+
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_REPORTED_ERRORS = 100
+
 @app.context_processor
 def inject_wishlist_count():
     if current_user.is_authenticated:
@@ -88,16 +157,77 @@ def normalize_city(city: str) -> str:
     return (city or "").strip().lower()
 
 def get_country_info(city: str):
-    city_key = normalize_city(city)
-    country = CITY_TO_COUNTRY.get(city_key, "india")
-    currency = COUNTRY_CURRENCY.get(country, COUNTRY_CURRENCY["india"])
-    costs = COUNTRY_COST_BASIS.get(country, COUNTRY_COST_BASIS["india"])
-    return country, currency, costs
+    return refdata.country_info(city)
 
 def city_image(city: str, country: str | None = None):
     seed = hashlib.md5(city.lower().encode()).hexdigest()
     return f"https://picsum.photos/seed/{seed}/600/400"
 
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / 4)
+
+def llm_cost(model, prompt_tokens, completion_tokens):
+    pricing = LLM_PRICING.get(model)
+    if not pricing:
+        return 0.0
+    return (prompt_tokens * pricing["prompt"] + completion_tokens * pricing["completion"]) / 1_000_000
+
+def llm_complete(route, prompt):
+    settings = LLM_ROUTES[route]
+
+    user_id = None
+    if has_request_context() and current_user.is_authenticated:
+        user_id = current_user.id
+
+    started = time.perf_counter()
+    status = "ok"
+    prompt_tokens = completion_tokens = 0
+    model = LLM_MODEL
+
+    try:
+        if estimate_tokens(prompt) > settings["max_prompt_tokens"]:
+            status = "rejected"
+            raise ValueError(f"Prompt for {route} exceeds its budget of {settings['max_prompt_tokens']} tokens.")
+
+        chat = client.chat.completions.create(
+            model=LLM_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=settings["max_tokens"],
+            temperature=settings["temperature"]
+        )
+
+        if chat.usage:
+            prompt_tokens = chat.usage.prompt_tokens or 0
+            completion_tokens = chat.usage.completion_tokens or 0
+        model = chat.model or LLM_MODEL
+
+        choice = chat.choices[0]
+        if getattr(choice, "finish_reason", None) == "length":
+            status = "truncated"
+            app.logger.warning("LLM response for route %s hit its max_tokens limit.", route)
+
+        return choice.message.content.strip()
+    except Exception:
+        if status == "ok":
+            status = "error"
+        raise
+    finally:
+        latency_ms = (time.perf_counter() - started) * 1000
+        try:
+            with app.app_context():
+                db.session.add(LlmCall(
+                    route=route,
+                    user_id=user_id,
+                    model=model,
+                    prompt_tokens=prompt_tokens,
+                    completion_tokens=completion_tokens,
+                    latency_ms=latency_ms,
+                    status=status
+                ))
+                db.session.commit()
+        except Exception:
+            app.logger.exception("Failed to record LLM call for route %s.", route)
+
 def resolve_city(city: str):
     prompt = f"""
 You are a location validator.
@@ -114,12 +244,7 @@ No explanation.
 """
 
     try:
-        chat = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=[{"role": "user", "content": prompt}]
-        )
-
-        result = chat.choices[0].message.content.strip()
+        result = llm_complete("resolve_city", prompt)
 
         if result.upper() == "INVALID":
             return None
@@ -128,6 +253,416 @@ No explanation.
     except Exception:
         return None
 
+def trip_cost_floor(costs, nights):
+    min_hotel = costs["hotel"] * nights
+    min_food = costs["meal"] * 2 * nights
+    min_transport = costs["transport"] * nights
+    min_activities = costs["activity"] * 4
+    return min_hotel + min_food + min_transport + min_activities
+
+def generate_itinerary(city, country, start_date, end_date, nights, currency, local_budget):
+    prompt = f"""
+Create a detailed travel itinerary for {city} (country: {country}) that is strictly budget-accurate.
+Dates: {start_date} to {end_date} (nights: {nights})
+Budget Local: {currency['symbol']}{local_budget:,.0f}
+Use realistic pricing and do not exceed the budget.
+"""
+    return llm_complete("itinerary", prompt)
+
+def reserve_prefetch_call():
+    with prefetch_lock:
+        today = date.today()
+        if prefetch_spend["day"] != today:
+            prefetch_spend["day"] = today
+            prefetch_spend["calls"] = 0
+
+        if prefetch_spend["calls"] >= PREFETCH_DAILY_CALLS:
+            return False
+
+        prefetch_spend["calls"] += 1
+        return True
+
+def sweep_prefetch_cache(now):
+    for key in [k for k, draft in prefetch_cache.items() if now - draft["created_at"] > PREFETCH_TTL]:
+        del prefetch_cache[key]
+
+def get_prefetched(city):
+    city_key = normalize_city(city)
+
+    with prefetch_lock:
+        draft = prefetch_cache.get(city_key)
+        if draft and datetime.utcnow() - draft["created_at"] > PREFETCH_TTL:
+            del prefetch_cache[city_key]
+            draft = None
+
+    return draft
+
+def prefetch_itinerary(city):
+    city_key = normalize_city(city)
+
+    try:
+        if refdata.is_known_city(city):
+            resolved = city.title()
+        else:
+            if not reserve_prefetch_call():
+                return
+            resolved = resolve_city(city)
+            if not resolved:
+                return
+
+        country, currency, costs = get_country_info(resolved)
+        nights = PREFETCH_DEFAULT_NIGHTS
+        start = date.today() + timedelta(days=PREFETCH_LEAD_DAYS)
+        end = start + timedelta(days=nights)
+
+        min_total_local = trip_cost_floor(costs, nights)
+        min_total_inr = min_total_local * currency["inr_per_unit"]
+        budget = math.ceil(min_total_inr / 1000) * 1000
+        local_budget = budget / currency["inr_per_unit"]
+
+        if not reserve_prefetch_call():
+            return
+
+        itinerary_text = generate_itinerary(
+            resolved, country, start.isoformat(), end.isoformat(),
+            nights, currency, local_budget
+        )
+
+        now = datetime.utcnow()
+        with prefetch_lock:
+            sweep_prefetch_cache(now)
+            prefetch_cache[city_key] = {
+                "city": resolved,
+                "start_date": start.isoformat(),
+                "end_date": end.isoformat(),
+                "budget": float(budget),
+                "min_budget": min_total_inr,
+                "itinerary": itinerary_text,
+                "created_at": now
+            }
+    except Exception:
+        app.logger.exception("Itinerary prefetch failed for %s.", city)
+    finally:
+        with prefetch_lock:
+            prefetch_pending.discard(city_key)
+
+def schedule_prefetch(city):
+    city_key = normalize_city(city)
+    if not city_key or get_prefetched(city_key):
+        return
+
+    with prefetch_lock:
+        if city_key in prefetch_pending or len(prefetch_pending) >= PREFETCH_MAX_QUEUE:
+            return
+        prefetch_pending.add(city_key)
+
+    prefetch_executor.submit(prefetch_itinerary, city)
+
+class TripIntervals:
+    def __init__(self, intervals=()):
+        self.starts = []
+        self.ends = []
+        self.reach = []
+        for start, end in sorted(intervals):
+            self.starts.append(start)
+            self.ends.append(end)
+        self.update_reach(0)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def update_reach(self, i):
+        del self.reach[i:]
+        for end in self.ends[i:]:
+            self.reach.append(max(end, self.reach[-1]) if self.reach else end)
+
+    def overlapping(self, start, end):
+        i = bisect.bisect_right(self.starts, end)
+        if not i or self.reach[i - 1] < start:
+            return None
+
+        i -= 1
+        while self.ends[i] < start:
+            i -= 1
+        return self.starts[i], self.ends[i]
+
+    def add(self, start, end):
+        i = bisect.bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.update_reach(i)
+
+    def remove(self, start, end):
+        i = bisect.bisect_left(self.starts, start)
+        while i < len(self.starts) and self.starts[i] == start:
+            if self.ends[i] == end:
+                del self.starts[i]
+                del self.ends[i]
+                self.update_reach(i)
+                return
+            i += 1
+
+    def free_windows(self, start, end, nights, limit):
+        windows = []
+        i = bisect.bisect_left(self.reach, start)
+        cursor = start
+
+        while len(windows) < limit and (end - cursor).days >= nights:
+            if i >= len(self.starts):
+                windows.append((cursor, end))
+                break
+
+            if self.starts[i] > cursor:
+                free_until = min(self.starts[i] - timedelta(days=1), end)
+                if (free_until - cursor).days >= nights:
+                    windows.append((cursor, free_until))
+
+            if self.ends[i] >= end:
+                break
+
+            cursor = max(cursor, self.ends[i] + timedelta(days=1))
+            i += 1
+
+        return windows
+
+def user_trip_intervals(user_id, start=None, end=None, exclude_id=None):
+    query = (
+        db.select(Trip.start_date, Trip.end_date)
+        .where(Trip.user_id == user_id)
+        .order_by(Trip.start_date)
+    )
+    if exclude_id is not None:
+        query = query.where(Trip.id != exclude_id)
+    if start:
+        query = query.where(Trip.end_date >= start)
+    if end:
+        query = query.where(Trip.start_date <= end)
+
+    rows = db.session.execute(query).all()
+    return TripIntervals((r.start_date, r.end_date) for r in rows)
+
+def find_free_windows(user_id, nights, start, horizon_days, limit):
+    end = start + timedelta(days=horizon_days)
+    intervals = user_trip_intervals(user_id, start, end)
+
+    return [
+        {
+            "start_date": window_start.isoformat(),
+            "end_date": (window_start + timedelta(days=nights)).isoformat(),
+            "free_until": free_until.isoformat()
+        }
+        for window_start, free_until in intervals.free_windows(start, end, nights, limit)
+    ]
+
+def ics_escape(value):
+    return (
+        str(value or "")
+        .replace("\r\n", "\n")
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+    )
+
+def ics_unescape(value):
+    return re.sub(
+        r"\\([\\;,nN])",
+        lambda m: "\n" if m.group(1) in "nN" else m.group(1),
+        value
+    )
+
+def ics_line(line):
+    data = line.encode("utf-8")
+    chunks = []
+    while len(data) > 75:
+        cut = 75 if not chunks else 74
+        while cut and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        chunks.append(data[:cut].decode("utf-8"))
+        data = data[cut:]
+    chunks.append(data.decode("utf-8"))
+    return "\r\n ".join(chunks) + "\r\n"
+
+def export_csv(rows, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(fields)
+    yield buffer.getvalue()
+
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow([row[f] for f in fields])
+        yield buffer.getvalue()
+
+def export_jsonl(rows, fields):
+    for row in rows:
+        yield json.dumps({f: row[f] for f in fields}) + "\n"
+
+def export_ics(trips):
+    yield ics_line("BEGIN:VCALENDAR")
+    yield ics_line("VERSION:2.0")
+    yield ics_line("PRODID:-//TravelPlanner//Trips//EN")
+
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    for t in trips:
+        yield ics_line("BEGIN:VEVENT")
+        yield ics_line(f"UID:trip-{t.id}@travelplanner")
+        yield ics_line(f"DTSTAMP:{stamp}")
+        yield ics_line(f"DTSTART;VALUE=DATE:{t.start_date.strftime('%Y%m%d')}")
+        yield ics_line(f"DTEND;VALUE=DATE:{(t.end_date + timedelta(days=1)).strftime('%Y%m%d')}")
+        yield ics_line(f"SUMMARY:{ics_escape(t.destination)}")
+        if t.notes:
+            yield ics_line(f"DESCRIPTION:{ics_escape(t.notes)}")
+        yield ics_line(f"X-TRAVELPLANNER-BUDGET:{t.budget or 0}")
+        yield ics_line("END:VEVENT")
+
+    yield ics_line("END:VCALENDAR")
+
+def trip_export_row(t):
+    return {
+        "destination": t.destination,
+        "start_date": t.start_date.isoformat(),
+        "end_date": t.end_date.isoformat(),
+        "budget": t.budget,
+        "notes": t.notes
+    }
+
+def wishlist_export_row(w):
+    return {
+        "destination": w.destination,
+        "image": w.image,
+        "created_at": w.created_at.isoformat() if w.created_at else None
+    }
+
+def parse_ics_date(value):
+    return datetime.strptime(value.split(":")[-1][:8], "%Y%m%d").date()
+
+def read_ics_rows(lines):
+    event = None
+    previous = None
+
+    def unfolded():
+        nonlocal previous
+        for raw in lines:
+            line = raw.rstrip("\r\n")
+            if line[:1] in (" ", "\t") and previous is not None:
+                previous += line[1:]
+                continue
+            if previous is not None:
+                yield previous
+            previous = line
+        if previous is not None:
+            yield previous
+
+    for line in unfolded():
+        name, _, value = line.partition(":")
+        key = name.split(";")[0].upper()
+
+        if key == "BEGIN" and value.upper() == "VEVENT":
+            event = {}
+        elif key == "END" and value.upper() == "VEVENT" and event is not None:
+            if event.pop("invalid", False):
+                yield None
+                event = None
+                continue
+            if "end_date" in event and event.get("all_day"):
+                event["end_date"] = event["end_date"] - timedelta(days=1)
+            elif "end_date" not in event and "start_date" in event:
+                event["end_date"] = event["start_date"]
+            event.pop("all_day", None)
+            yield event
+            event = None
+        elif event is not None:
+            if key == "SUMMARY":
+                event["destination"] = ics_unescape(value)
+            elif key == "DESCRIPTION":
+                event["notes"] = ics_unescape(value)
+            elif key in ("DTSTART", "DTEND"):
+                try:
+                    parsed = parse_ics_date(value)
+                except ValueError:
+                    event["invalid"] = True
+                    continue
+                if key == "DTSTART":
+                    event["start_date"] = parsed
+                    event["all_day"] = "T" not in value
+                else:
+                    event["end_date"] = parsed
+            elif key == "X-TRAVELPLANNER-BUDGET":
+                event["budget"] = value
+
+def read_import_rows(stream, fmt):
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+    if fmt == "csv":
+        yield from csv.DictReader(text)
+    elif fmt == "jsonl":
+        for line in text:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                yield None
+    elif fmt == "ics":
+        yield from read_ics_rows(text)
+
+def parse_import_date(value):
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value or "").strip(), "%Y-%m-%d").date()
+
+def parse_trip_row(row):
+    if not isinstance(row, dict):
+        raise ValueError("Row is not a valid record.")
+
+    destination = row.get("destination") or ""
+    if not isinstance(destination, str):
+        raise ValueError("Destination must be text.")
+    destination = destination.strip()
+    if not destination:
+        raise ValueError("Destination is required.")
+
+    notes = row.get("notes") or ""
+    if not isinstance(notes, str):
+        raise ValueError("Notes must be text.")
+
+    try:
+        start = parse_import_date(row.get("start_date"))
+        end = parse_import_date(row.get("end_date"))
+    except ValueError:
+        raise ValueError("Dates must be in YYYY-MM-DD format.")
+
+    if start > end:
+        raise ValueError("Start date cannot be after end date.")
+
+    try:
+        budget = float(row.get("budget") or 0)
+    except (TypeError, ValueError):
+        raise ValueError("Budget must be a number.")
+
+    if not math.isfinite(budget):
+        raise ValueError("Budget must be a number.")
+
+    return destination, start, end, budget, notes
+
+def rate_limited(endpoint, methods=None, as_json=False):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if methods is None or request.method in methods:
+                allowed, retry_after = rate_limiter.check(endpoint, current_user.id)
+                if not allowed:
+                    headers = {"Retry-After": str(retry_after)}
+                    if as_json:
+                        return jsonify({"status": "error", "message": "Too many requests."}), 429, headers
+                    return render_template("429.html", retry_after=retry_after), 429, headers
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
 def send_contact_email(name, sender_email, message):
     email_address = os.getenv("EMAIL_KEY")
     email_password = os.getenv("PASSWORD_KEY")
@@ -152,9 +687,42 @@ Message:
         smtp.login(email_address, email_password)
         smtp.send_message(msg)
 
+@event.listens_for(Engine, "before_cursor_execute")
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "query_count" in g:
+        g.query_count += 1
+
+@event.listens_for(Session, "do_orm_execute")
+def guard_lazy_load(orm_execute_state):
+    if orm_execute_state.lazy_loaded_from is None or not query_guard_enabled():
+        return
+    raise RuntimeError(
+        f"Unexpected lazy load of {orm_execute_state.loader_strategy_path} "
+        f"during {request.endpoint}; load it explicitly with selectinload()."
+    )
+
+def query_guard_enabled():
+    return has_request_context() and (app.testing or app.config.get("QUERY_GUARD"))
+
+@app.before_request
+def start_query_count():
+    g.query_count = 0
+
+@app.after_request
+def check_query_budget(response):
+    if not query_guard_enabled():
+        return response
+
+    budget = QUERY_BUDGETS.get(request.endpoint, DEFAULT_QUERY_BUDGET)
+    if budget is not None and g.get("query_count", 0) > budget:
+        raise RuntimeError(
+            f"{request.endpoint} ran {g.query_count} queries, over its budget of {budget}."
+        )
+    return response
+
 @login_manager.user_loader
 def load_user(user_id):
-    return db.session.get(User, int(user_id))
+    return db.session.get(User, int(user_id), options=[raiseload("*")])
 
 class User(UserMixin, db.Model):
     __tablename__ = "users"
@@ -181,6 +749,10 @@ class Trip(db.Model):
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     user: Mapped["User"] = relationship("User", back_populates="trips")
 
+    __table_args__ = (
+        Index("ix_trips_user_start", "user_id", "start_date"),
+    )
+
 class Wishlist(db.Model):
     __tablename__ = "wishlists"
 
@@ -192,6 +764,19 @@ class Wishlist(db.Model):
 
     user: Mapped["User"] = relationship("User", backref="wishlist")
 
+class LlmCall(db.Model):
+    __tablename__ = "llm_calls"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    route: Mapped[str] = mapped_column(String(50), nullable=False)
+    user_id: Mapped[int | None] = mapped_column(ForeignKey("users.id"), nullable=True)
+    model: Mapped[str] = mapped_column(String(100), nullable=False)
+    prompt_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    completion_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    latency_ms: Mapped[float] = mapped_column(Float, default=0)
+    status: Mapped[str] = mapped_column(String(20), default="ok")
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
 @app.route('/')
 def home():
     return render_template('index.html')
@@ -205,20 +790,16 @@ def create_trip():
         start = datetime.strptime(request.form.get('start_date'), '%Y-%m-%d').date()
         end = datetime.strptime(request.form.get('end_date'), '%Y-%m-%d').date()
 
-        existing_trips = db.session.execute(
-            db.select(Trip).where(Trip.user_id == current_user.id)
-        ).scalars().all()
-
-        for t in existing_trips:
-            if not (end < t.start_date or start > t.end_date):
-                flash(
-                    f"Trip overlaps with an existing trip from "
-                    f"{fmt_date(t.start_date)} to {fmt_date(t.end_date)}.",
-                    "danger"
-                )
-                return redirect(url_for('create_trip'))
+        clash = user_trip_intervals(current_user.id, start, end).overlapping(start, end)
+        if clash:
+            flash(
+                f"Trip overlaps with an existing trip from "
+                f"{fmt_date(clash[0])} to {fmt_date(clash[1])}.",
+                "danger"
+            )
+            return redirect(url_for('create_trip'))
 
-        country = CITY_TO_COUNTRY.get(normalize_city(destination))
+        country = refdata.country_for(destination)
 
         trip = Trip(
             user_id=current_user.id,
@@ -243,7 +824,7 @@ def my_trips():
 
     trips = (
         db.session.execute(
-            db.select(Trip)
+            db.select(Trip).options(raiseload("*"))
             .where(Trip.user_id == current_user.id)
             .order_by(
                 (Trip.end_date < today),  
@@ -259,7 +840,7 @@ def my_trips():
 @app.route('/trip/<int:id>')
 @login_required
 def trip_details(id):
-    trip = db.session.get(Trip, id)
+    trip = db.session.get(Trip, id, options=[raiseload("*")])
     if trip is None or trip.user_id != current_user.id:
         flash("Trip not found or access denied.", "danger")
         return redirect(url_for('my_trips'))
@@ -267,6 +848,7 @@ def trip_details(id):
 
 @app.route('/explore')
 @login_required
+@rate_limited("explore")
 def explore():
     try:
         prompt = """
@@ -277,24 +859,19 @@ def explore():
           { "name": "City Name", "desc": "Short description" }
         ]
         """
-        chat = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=[{"role": "user", "content": prompt}]
-        )
-
-        raw = chat.choices[0].message.content.strip()
+        raw = llm_complete("explore", prompt)
         raw = raw.replace("```json", "").replace("```", "").strip()
         destinations = json.loads(raw)
 
         for d in destinations:
             city = d["name"]
-            country = CITY_TO_COUNTRY.get(normalize_city(city))
+            country = refdata.country_for(city)
             d["image"] = city_image(city, country)
 
         wishlisted = {
-            w.destination.lower()
-            for w in db.session.execute(
-                db.select(Wishlist).where(Wishlist.user_id == current_user.id)
+            destination.lower()
+            for destination in db.session.execute(
+                db.select(Wishlist.destination).where(Wishlist.user_id == current_user.id)
             ).scalars().all()
         }
 
@@ -315,9 +892,9 @@ def explore():
         ]
 
         wishlisted = {
-            w.destination.lower()
-            for w in db.session.execute(
-                db.select(Wishlist).where(Wishlist.user_id == current_user.id)
+            destination.lower()
+            for destination in db.session.execute(
+                db.select(Wishlist.destination).where(Wishlist.user_id == current_user.id)
             ).scalars().all()
         }
 
@@ -334,7 +911,7 @@ def add_to_wishlist():
     image = request.form.get('image')
 
     item = db.session.execute(
-        db.select(Wishlist).where(
+        db.select(Wishlist).options(raiseload("*")).where(
             Wishlist.user_id == current_user.id,
             db.func.lower(Wishlist.destination) == destination.lower()
         )
@@ -352,6 +929,7 @@ def add_to_wishlist():
             )
         )
         db.session.commit()
+        schedule_prefetch(destination)
 
     return redirect(url_for('explore'))
 
@@ -359,7 +937,7 @@ def add_to_wishlist():
 @login_required
 def wishlist():
     items = db.session.execute(
-        db.select(Wishlist)
+        db.select(Wishlist).options(raiseload("*"))
         .where(Wishlist.user_id == current_user.id)
         .order_by(Wishlist.created_at.desc())
     ).scalars().all()
@@ -369,7 +947,7 @@ def wishlist():
 @app.route('/wishlist/remove/<int:id>')
 @login_required
 def remove_wishlist_get(id):
-    item = db.session.get(Wishlist, id)
+    item = db.session.get(Wishlist, id, options=[raiseload("*")])
 
     if item and item.user_id == current_user.id:
         db.session.delete(item)
@@ -384,7 +962,7 @@ def remove_wishlist():
     data = request.get_json()
     item_id = data.get("item_id")
 
-    item = db.session.get(Wishlist, item_id)
+    item = db.session.get(Wishlist, item_id, options=[raiseload("*")])
 
     if item and item.user_id == current_user.id:
         db.session.delete(item)
@@ -404,7 +982,7 @@ def undo_wishlist():
         return {"status": "error"}
 
     existing = db.session.execute(
-        db.select(Wishlist).where(
+        db.select(Wishlist).options(raiseload("*")).where(
             Wishlist.user_id == current_user.id,
             db.func.lower(Wishlist.destination) == destination.lower()
         )
@@ -417,18 +995,22 @@ def undo_wishlist():
             image=image
         ))
         db.session.commit()
+        schedule_prefetch(destination)
 
     return {"status": "restored"}
 
 @app.route('/itinerary/<path:city>', methods=['GET', 'POST'])
 @login_required
+@rate_limited("itinerary", methods=("POST",))
 def itinerary(city):
-    country = CITY_TO_COUNTRY.get(normalize_city(city))
+    country = refdata.country_for(city)
     image = city_image(city, country)
 
-    city_key = normalize_city(city)
+    draft = get_prefetched(city)
 
-    if city_key in CITY_TO_COUNTRY:
+    if draft:
+        corrected_city = draft["city"]
+    elif refdata.is_known_city(city):
         corrected_city = city.title()
     else:
         corrected_city = resolve_city(city)
@@ -461,12 +1043,7 @@ def itinerary(city):
 
         nights = (end - start).days or 1
 
-        min_hotel = costs["hotel"] * nights
-        min_food = costs["meal"] * 2 * nights
-        min_transport = costs["transport"] * nights
-        min_activities = costs["activity"] * 4
-
-        min_total_local = min_hotel + min_food + min_transport + min_activities
+        min_total_local = trip_cost_floor(costs, nights)
         min_total_inr = min_total_local * currency["inr_per_unit"]
 
         if local_budget < min_total_local:
@@ -481,18 +1058,10 @@ def itinerary(city):
                 budget=budget_in_inr
             )
 
-        prompt = f"""
-Create a detailed travel itinerary for {city} (country: {country}) that is strictly budget-accurate.
-Dates: {start_date} to {end_date} (nights: {nights})
-Budget Local: {currency['symbol']}{local_budget:,.0f}
-Use realistic pricing and do not exceed the budget.
-"""
-        chat = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=[{"role": "user", "content": prompt}]
-        )
-
-        itinerary_text = chat.choices[0].message.content.strip()
+        if draft and (draft["start_date"], draft["end_date"], draft["budget"]) == (start_date, end_date, budget):
+            itinerary_text = draft["itinerary"]
+        else:
+            itinerary_text = generate_itinerary(city, country, start_date, end_date, nights, currency, local_budget)
 
         return render_template(
             "itinerary.html",
@@ -504,6 +1073,18 @@ Use realistic pricing and do not exceed the budget.
             budget=budget_in_inr
         )
 
+    if draft and not request.args.get('fresh'):
+        return render_template(
+            "itinerary.html",
+            city=city,
+            image=image,
+            itinerary=draft["itinerary"],
+            start_date=draft["start_date"],
+            end_date=draft["end_date"],
+            budget=draft["budget"],
+            prefetched=True
+        )
+
     return render_template(
         "itinerary.html",
         city=city,
@@ -511,7 +1092,10 @@ Use realistic pricing and do not exceed the budget.
         itinerary=None,
         start_date=None,
         end_date=None,
-        budget=None
+        budget=None,
+        free_windows=find_free_windows(
+            current_user.id, FREE_WINDOW_DEFAULT_NIGHTS, date.today(), 365, 5
+        )
     )
 
 @app.route('/save_itinerary', methods=['POST'])
@@ -534,20 +1118,16 @@ def save_itinerary():
         flash("Start date cannot be after end date.", "danger")
         return redirect(request.referrer)
 
-    existing_trips = db.session.execute(
-        db.select(Trip).where(Trip.user_id == current_user.id)
-    ).scalars().all()
-
-    for t in existing_trips:
-        if not (end < t.start_date or start > t.end_date):
-            flash(
-                f"Trip overlaps with an existing trip from "
-                f"{fmt_date(t.start_date)} to {fmt_date(t.end_date)}.",
-                "danger"
-            )
-            return redirect(request.referrer)
+    clash = user_trip_intervals(current_user.id, start, end).overlapping(start, end)
+    if clash:
+        flash(
+            f"Trip overlaps with an existing trip from "
+            f"{fmt_date(clash[0])} to {fmt_date(clash[1])}.",
+            "danger"
+        )
+        return redirect(request.referrer)
 
-    country = CITY_TO_COUNTRY.get(normalize_city(destination))
+    country = refdata.country_for(destination)
     image = city_image(destination, country)
 
     trip = Trip(
@@ -566,8 +1146,36 @@ def save_itinerary():
     flash("Trip added!", "success")
     return redirect(url_for('my_trips'))
 
+@app.route('/free-windows')
+@login_required
+def free_windows():
+    try:
+        nights = int(request.args.get("nights", FREE_WINDOW_DEFAULT_NIGHTS))
+        horizon = int(request.args.get("horizon", 365))
+        limit = int(request.args.get("limit", 5))
+        start = request.args.get("from")
+        start = datetime.strptime(start, "%Y-%m-%d").date() if start else date.today()
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid parameters."}), 400
+
+    if nights < 0 or horizon < 1 or limit < 1:
+        return jsonify({"status": "error", "message": "Invalid parameters."}), 400
+
+    horizon = min(horizon, FREE_WINDOW_MAX_HORIZON, (date.max - start).days)
+    limit = min(limit, FREE_WINDOW_MAX_RESULTS)
+
+    if horizon < 1 or nights > horizon:
+        return jsonify({"status": "error", "message": "Invalid parameters."}), 400
+
+    return jsonify({
+        "status": "ok",
+        "nights": nights,
+        "windows": find_free_windows(current_user.id, nights, start, horizon, limit)
+    })
+
 @app.route("/search-destination")
 @login_required
+@rate_limited("search", as_json=True)
 def search_destination():
     city = request.args.get("city", "").strip()
 
@@ -599,10 +1207,152 @@ def search_destination():
     except Exception:
         return jsonify({"found": False})
 
+@app.route('/trips/export/<fmt>')
+@login_required
+def export_trips(fmt):
+    if fmt not in EXPORT_MIMETYPES:
+        flash("Unsupported export format.", "danger")
+        return redirect(url_for('my_trips'))
+
+    trips = db.session.execute(
+        db.select(Trip).options(raiseload("*"))
+        .where(Trip.user_id == current_user.id)
+        .order_by(Trip.start_date)
+        .execution_options(yield_per=IMPORT_BATCH_SIZE)
+    ).scalars()
+
+    if fmt == "ics":
+        body = export_ics(trips)
+    elif fmt == "csv":
+        body = export_csv((trip_export_row(t) for t in trips), TRIP_EXPORT_FIELDS)
+    else:
+        body = export_jsonl((trip_export_row(t) for t in trips), TRIP_EXPORT_FIELDS)
+
+    return Response(
+        stream_with_context(body),
+        mimetype=EXPORT_MIMETYPES[fmt],
+        headers={"Content-Disposition": f"attachment; filename=trips.{fmt}"}
+    )
+
+@app.route('/wishlist/export/<fmt>')
+@login_required
+def export_wishlist(fmt):
+    if fmt not in ("csv", "jsonl"):
+        flash("Unsupported export format.", "danger")
+        return redirect(url_for('wishlist'))
+
+    items = db.session.execute(
+        db.select(Wishlist).options(raiseload("*"))
+        .where(Wishlist.user_id == current_user.id)
+        .order_by(Wishlist.created_at.desc())
+        .execution_options(yield_per=IMPORT_BATCH_SIZE)
+    ).scalars()
+
+    rows = (wishlist_export_row(w) for w in items)
+    if fmt == "csv":
+        body = export_csv(rows, WISHLIST_EXPORT_FIELDS)
+    else:
+        body = export_jsonl(rows, WISHLIST_EXPORT_FIELDS)
+
+    return Response(
+        stream_with_context(body),
+        mimetype=EXPORT_MIMETYPES[fmt],
+        headers={"Content-Disposition": f"attachment; filename=wishlist.{fmt}"}
+    )
+
+@app.route('/trips/import', methods=['POST'])
+@login_required
+def import_trips():
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        return jsonify({"status": "error", "message": "No file uploaded."}), 400
+
+    fmt = (request.form.get("format") or upload.filename.rsplit(".", 1)[-1]).lower()
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({"status": "error", "message": "Unsupported import format."}), 400
+
+    started = time.perf_counter()
+    intervals = user_trip_intervals(current_user.id)
+    errors = []
+    error_count = 0
+    imported = 0
+    rows = 0
+    batch = []
+
+    def flush():
+        nonlocal batch, imported
+        if not batch:
+            return
+        try:
+            db.session.add_all([trip for _, trip in batch])
+            db.session.commit()
+            imported += len(batch)
+        except SQLAlchemyError:
+            db.session.rollback()
+            app.logger.exception("Trip import batch failed for user %s.", current_user.id)
+            for row_number, trip in batch:
+                intervals.remove(trip.start_date, trip.end_date)
+                reject(row_number, "Could not save this trip.")
+        batch = []
+
+    def reject(row_number, message):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+            errors.append({"row": row_number, "error": message})
+
+    try:
+        for row in read_import_rows(upload.stream, fmt):
+            rows += 1
+            try:
+                destination, start, end, budget, notes = parse_trip_row(row)
+            except ValueError as e:
+                reject(rows, str(e))
+                continue
+
+            clash = intervals.overlapping(start, end)
+            if clash:
+                reject(
+                    rows,
+                    f"Trip overlaps with an existing trip from "
+                    f"{fmt_date(clash[0])} to {fmt_date(clash[1])}."
+                )
+                continue
+
+            intervals.add(start, end)
+            country = refdata.country_for(destination)
+            batch.append((rows, Trip(
+                user_id=current_user.id,
+                destination=destination,
+                start_date=start,
+                end_date=end,
+                budget=budget,
+                notes=notes,
+                image=city_image(destination, country)
+            )))
+
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                flush()
+    except (UnicodeDecodeError, csv.Error) as e:
+        reject(rows + 1, f"Could not parse file: {e}")
+
+    flush()
+    elapsed = time.perf_counter() - started
+
+    return jsonify({
+        "status": "ok",
+        "rows": rows,
+        "imported": imported,
+        "error_count": error_count,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(rows / elapsed, 1) if elapsed else None
+    })
+
 @app.route('/edit_trip/<int:id>', methods=['GET', 'POST'])
 @login_required
 def edit_trip(id):
-    trip = db.session.get(Trip, id)
+    trip = db.session.get(Trip, id, options=[raiseload("*")])
 
     if trip is None or trip.user_id != current_user.id:
         flash("Trip not found or access denied.", "danger")
@@ -616,21 +1366,14 @@ def edit_trip(id):
             flash("Start date cannot be after end date.", "danger")
             return redirect(url_for('edit_trip', id=id))
 
-        existing_trips = db.session.execute(
-            db.select(Trip).where(
-                Trip.user_id == current_user.id,
-                Trip.id != id
+        clash = user_trip_intervals(current_user.id, start, end, exclude_id=id).overlapping(start, end)
+        if clash:
+            flash(
+                f"Edited dates overlap with an existing trip from "
+                f"{fmt_date(clash[0])} to {fmt_date(clash[1])}.",
+                "danger"
             )
-        ).scalars().all()
-
-        for t in existing_trips:
-            if not (end < t.start_date or start > t.end_date):
-                flash(
-                    f"Edited dates overlap with an existing trip from "
-                    f"{fmt_date(t.start_date)} to {fmt_date(t.end_date)}.",
-                    "danger"
-                )
-                return redirect(url_for('edit_trip', id=id))
+            return redirect(url_for('edit_trip', id=id))
 
         trip.destination = request.form.get('destination')
         trip.start_date = start
@@ -648,7 +1391,7 @@ def edit_trip(id):
 @app.route('/delete_trip/<int:id>', methods=['POST'])
 @login_required
 def delete_trip(id):
-    trip = db.session.get(Trip, id)
+    trip = db.session.get(Trip, id, options=[raiseload("*")])
 
     if trip is None or trip.user_id != current_user.id:
         flash("Trip not found or access denied.", "danger")
@@ -691,7 +1434,7 @@ def edit_profile():
 @login_required
 def dashboard():
     trips = db.session.execute(
-        db.select(Trip).where(Trip.user_id == current_user.id)
+        db.select(Trip).options(raiseload("*")).where(Trip.user_id == current_user.id)
     ).scalars().all()
 
     today = date.today()
@@ -755,7 +1498,7 @@ def register():
         confirm_password = request.form.get('confirm_password')
 
         existing = db.session.execute(
-            db.select(User).where(User.email == email)
+            db.select(User).options(raiseload("*")).where(User.email == email)
         ).scalar_one_or_none()
 
         if existing:
@@ -785,7 +1528,7 @@ def login():
         password = request.form.get('password')
 
         user = db.session.execute(
-            db.select(User).where(User.email == email)
+            db.select(User).options(raiseload("*")).where(User.email == email)
         ).scalar_one_or_none()
 
         if user and check_password_hash(user.password_hash, password):
@@ -803,6 +1546,72 @@ def logout():
     logout_user()
     return redirect(url_for('home'))
 
+@app.route('/metrics')
+def metrics():
+    return Response(rate_limiter.metrics_text(), mimetype="text/plain; version=0.0.4")
+
+@app.cli.command("llm-report")
+@click.option("--days", default=7, show_default=True, help="How many days of calls to include.")
+@click.option("--top", default=10, show_default=True, help="How many users to list by cost.")
+def llm_report(days, top):
+    since = datetime.utcnow() - timedelta(days=days)
+
+    routes = db.session.execute(
+        db.select(
+            LlmCall.route,
+            LlmCall.model,
+            db.func.count(LlmCall.id).label("calls"),
+            db.func.sum(db.case((LlmCall.status == "error", 1), else_=0)).label("errors"),
+            db.func.sum(db.case((LlmCall.status == "rejected", 1), else_=0)).label("rejected"),
+            db.func.sum(db.case((LlmCall.status == "truncated", 1), else_=0)).label("truncated"),
+            db.func.sum(LlmCall.prompt_tokens).label("prompt_tokens"),
+            db.func.sum(LlmCall.completion_tokens).label("completion_tokens"),
+            db.func.sum(LlmCall.latency_ms).label("latency_ms"),
+            db.func.max(LlmCall.latency_ms).label("max_latency_ms")
+        )
+        .where(LlmCall.created_at >= since)
+        .group_by(LlmCall.route, LlmCall.model)
+    ).all()
+
+    rows = []
+    for r in routes:
+        cost = llm_cost(r.model, r.prompt_tokens or 0, r.completion_tokens or 0)
+        seconds = (r.latency_ms or 0) / 1000
+        rows.append((cost, r, seconds))
+    rows.sort(key=lambda row: row[0], reverse=True)
+
+    click.echo(f"LLM usage for the last {days} day(s)\n")
+    click.echo(f"{'route':<14}{'model':<24}{'calls':>7}{'errors':>8}{'rejected':>10}{'truncated':>11}{'prompt':>10}{'completion':>12}{'avg ms':>9}{'max ms':>9}{'tok/s':>10}{'cost $':>12}")
+    for cost, r, seconds in rows:
+        tokens_per_sec = (r.completion_tokens or 0) / seconds if seconds else 0
+        click.echo(
+            f"{r.route:<14}{r.model:<24}{r.calls:>7}{r.errors or 0:>8}{r.rejected or 0:>10}{r.truncated or 0:>11}{r.prompt_tokens or 0:>10}"
+            f"{r.completion_tokens or 0:>12}{(r.latency_ms or 0) / r.calls:>9.0f}{r.max_latency_ms or 0:>9.0f}"
+            f"{tokens_per_sec:>10.1f}{cost:>12.6f}"
+        )
+
+    users = db.session.execute(
+        db.select(
+            LlmCall.user_id,
+            LlmCall.model,
+            db.func.count(LlmCall.id).label("calls"),
+            db.func.sum(LlmCall.prompt_tokens).label("prompt_tokens"),
+            db.func.sum(LlmCall.completion_tokens).label("completion_tokens")
+        )
+        .where(LlmCall.created_at >= since)
+        .group_by(LlmCall.user_id, LlmCall.model)
+    ).all()
+
+    by_user = {}
+    for u in users:
+        calls, cost = by_user.get(u.user_id, (0, 0.0))
+        by_user[u.user_id] = (calls + u.calls, cost + llm_cost(u.model, u.prompt_tokens or 0, u.completion_tokens or 0))
+
+    click.echo(f"\nTop {top} users by cost")
+    for user_id, (calls, cost) in sorted(by_user.items(), key=lambda item: item[1][1], reverse=True)[:top]:
+        label = user_id if user_id is not None else "(background)"
+        click.echo(f"{str(label):<14}{calls:>7} calls{cost:>12.6f} $")
+
 @app.errorhandler(404)
 def page_not_found(e):
     return render_template('404.html'), 404
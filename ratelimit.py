@@ -0,0 +1,140 @@
+from collections import deque
+import threading
+import sqlite3
+import math
+import time
+
+SWEEP_EVERY = 1000
+
+class MemoryBackend:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = {}
+        self.calls = 0
+
+    def trim(self, key, window, now):
+        events = self.events.get(key)
+        if events is None:
+            events = self.events[key] = deque()
+        while events and events[0] <= now - window:
+            events.popleft()
+        return events
+
+    def sweep(self, now, max_window):
+        for key in [k for k, events in self.events.items() if not events or events[-1] <= now - max_window]:
+            del self.events[key]
+
+    def acquire(self, checks, now, max_window):
+        with self.lock:
+            self.calls += 1
+            if self.calls % SWEEP_EVERY == 0:
+                self.sweep(now, max_window)
+
+            for key, limit, window in checks:
+                events = self.trim(key, window, now)
+                if len(events) >= limit:
+                    return events[0] + window - now, key
+
+            for key, _, _ in checks:
+                self.events[key].append(now)
+
+            return 0.0, None
+
+class SQLiteBackend:
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.calls = 0
+
+        conn = self.connect()
+        conn.execute("CREATE TABLE IF NOT EXISTS rate_events (key TEXT NOT NULL, ts REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_rate_events_key_ts ON rate_events (key, ts)")
+
+    def connect(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def acquire(self, checks, now, max_window):
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.calls += 1
+            if self.calls % SWEEP_EVERY == 0:
+                conn.execute("DELETE FROM rate_events WHERE ts <= ?", (now - max_window,))
+
+            for key, limit, window in checks:
+                count, oldest = conn.execute(
+                    "SELECT COUNT(*), MIN(ts) FROM rate_events WHERE key = ? AND ts > ?",
+                    (key, now - window)
+                ).fetchone()
+                if count >= limit:
+                    conn.execute("COMMIT")
+                    return oldest + window - now, key
+
+            conn.executemany(
+                "INSERT INTO rate_events (key, ts) VALUES (?, ?)",
+                [(key, now) for key, _, _ in checks]
+            )
+            conn.execute("COMMIT")
+            return 0.0, None
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+class RateLimiter:
+    def __init__(self, limits, backend=None):
+        self.limits = limits
+        self.backend = backend or MemoryBackend()
+        self.max_window = max(
+            window for scopes in limits.values() for _, window in scopes.values()
+        )
+        self.lock = threading.Lock()
+        self.decisions = {}
+
+    def record(self, endpoint, scope, decision):
+        with self.lock:
+            key = (endpoint, scope, decision)
+            self.decisions[key] = self.decisions.get(key, 0) + 1
+
+    def check(self, endpoint, user_id):
+        limits = self.limits[endpoint]
+        checks = []
+        scopes = {}
+
+        if "user" in limits:
+            key = f"{endpoint}:user:{user_id}"
+            checks.append((key, *limits["user"]))
+            scopes[key] = "user"
+
+        if "global" in limits:
+            key = f"{endpoint}:global"
+            checks.append((key, *limits["global"]))
+            scopes[key] = "global"
+
+        retry_after, rejected_key = self.backend.acquire(checks, time.time(), self.max_window)
+
+        if rejected_key is None:
+            self.record(endpoint, "all", "allowed")
+            return True, 0
+
+        self.record(endpoint, scopes[rejected_key], "rejected")
+        return False, max(1, math.ceil(retry_after))
+
+    def metrics_text(self):
+        with self.lock:
+            decisions = sorted(self.decisions.items())
+
+        lines = [
+            "# HELP ratelimit_decisions_total Rate limiter decisions by endpoint class, scope and outcome.",
+            "# TYPE ratelimit_decisions_total counter"
+        ]
+        for (endpoint, scope, decision), count in decisions:
+            lines.append(
+                f'ratelimit_decisions_total{{endpoint="{endpoint}",scope="{scope}",decision="{decision}"}} {count}'
+            )
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,293 @@
+import threading
+import logging
+import tempfile
+import struct
+import mmap
+import json
+import time
+import sys
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_PATH = os.path.join(BASE_DIR, "data", "refdata.json")
+COMPILED_PATH = os.path.join(BASE_DIR, "data", "refdata.bin")
+
+MAGIC = b"TPRD"
+FORMAT_VERSION = 2
+RELOAD_INTERVAL = 5.0
+FALLBACK_COUNTRY = "india"
+
+HEADER = struct.Struct("<4sIIIIQq")
+COUNTRY_RECORD = struct.Struct("<IIIIddddd")
+CITY_RECORD = struct.Struct("<IHH")
+
+COST_KEYS = ("hotel", "meal", "transport", "activity")
+
+logger = logging.getLogger(__name__)
+
+def normalize_key(name):
+    return (name or "").strip().lower()
+
+def compile_refdata(source_path=SOURCE_PATH, compiled_path=COMPILED_PATH):
+    with open(source_path, encoding="utf-8") as f:
+        source_stat = os.fstat(f.fileno())
+        source = json.load(f)
+
+    countries = sorted(
+        (normalize_key(k).encode("utf-8"), v) for k, v in source["countries"].items()
+    )
+    country_index = {name: i for i, (name, _) in enumerate(countries)}
+
+    if FALLBACK_COUNTRY.encode("utf-8") not in country_index:
+        raise ValueError(f"Reference data must define the fallback country '{FALLBACK_COUNTRY}'.")
+
+    cities = []
+    for city, country in source["cities"].items():
+        country_key = normalize_key(country).encode("utf-8")
+        if country_key not in country_index:
+            raise ValueError(f"City '{city}' refers to unknown country '{country}'.")
+        cities.append((normalize_key(city).encode("utf-8"), country_index[country_key]))
+    cities.sort()
+
+    strings = bytearray()
+
+    def intern(value):
+        offset = len(strings)
+        strings.extend(value)
+        return offset, len(value)
+
+    country_records = []
+    for name, info in countries:
+        name_off, name_len = intern(name)
+        sym_off, sym_len = intern(info["symbol"].encode("utf-8"))
+        country_records.append(COUNTRY_RECORD.pack(
+            name_off, name_len, sym_off, sym_len,
+            float(info["inr_per_unit"]),
+            *(float(info["costs"][k]) for k in COST_KEYS)
+        ))
+
+    city_records = []
+    for name, country_idx in cities:
+        if len(name) > 0xFFFF:
+            raise ValueError(f"City name too long: {name[:40]!r}")
+        name_off, name_len = intern(name)
+        city_records.append(CITY_RECORD.pack(name_off, name_len, country_idx))
+
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, int(source.get("version", 0)), len(countries), len(cities),
+        source_stat.st_size, source_stat.st_mtime_ns
+    )
+
+    directory = os.path.dirname(os.path.abspath(compiled_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".refdata-", suffix=".tmp")
+    try:
+        os.fchmod(fd, 0o644)
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.writelines(country_records)
+            f.writelines(city_records)
+            f.write(strings)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, compiled_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    return len(countries), len(cities)
+
+class RefData:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        magic, fmt, self.version, self.n_countries, self.n_cities, _, _ = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a compiled reference data file.")
+
+        self.countries_at = HEADER.size
+        self.cities_at = self.countries_at + self.n_countries * COUNTRY_RECORD.size
+        self.strings_at = self.cities_at + self.n_cities * CITY_RECORD.size
+
+    def string(self, offset, length):
+        start = self.strings_at + offset
+        return self.mm[start:start + length]
+
+    def country_record(self, idx):
+        return COUNTRY_RECORD.unpack_from(self.mm, self.countries_at + idx * COUNTRY_RECORD.size)
+
+    def city_record(self, idx):
+        return CITY_RECORD.unpack_from(self.mm, self.cities_at + idx * CITY_RECORD.size)
+
+    def search(self, key, table_at, count, record):
+        mm = self.mm
+        strings_at = self.strings_at
+        unpack_from = record.unpack_from
+        size = record.size
+
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            name_off, name_len = unpack_from(mm, table_at + mid * size)[:2]
+            start = strings_at + name_off
+            name = mm[start:start + name_len]
+            if name < key:
+                lo = mid + 1
+            elif name > key:
+                hi = mid
+            else:
+                return mid
+        return None
+
+    def city_country_index(self, city):
+        key = normalize_key(city).encode("utf-8")
+        idx = self.search(key, self.cities_at, self.n_cities, CITY_RECORD)
+        if idx is None:
+            return None
+        return self.city_record(idx)[2]
+
+    def country_index(self, country):
+        key = normalize_key(country).encode("utf-8")
+        return self.search(key, self.countries_at, self.n_countries, COUNTRY_RECORD)
+
+    def country_info(self, idx):
+        name_off, name_len, sym_off, sym_len, rate, *costs = self.country_record(idx)
+        return (
+            self.string(name_off, name_len).decode("utf-8"),
+            {"symbol": self.string(sym_off, sym_len).decode("utf-8"), "inr_per_unit": rate},
+            dict(zip(COST_KEYS, costs))
+        )
+
+class RefDataStore:
+    def __init__(self, source_path=SOURCE_PATH, compiled_path=COMPILED_PATH):
+        self.source_path = source_path
+        self.compiled_path = compiled_path
+        self.lock = threading.Lock()
+        self.data = None
+        self.checked_at = 0.0
+
+    def needs_compile(self):
+        if not os.path.exists(self.source_path):
+            return False
+        if not os.path.exists(self.compiled_path):
+            return True
+
+        with open(self.compiled_path, "rb") as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return True
+
+        magic, fmt, _, _, _, source_size, source_mtime_ns = HEADER.unpack(header)
+        stat = os.stat(self.source_path)
+        return (
+            magic != MAGIC or fmt != FORMAT_VERSION
+            or (source_size, source_mtime_ns) != (stat.st_size, stat.st_mtime_ns)
+        )
+
+    def current(self):
+        data = self.data
+        now = time.monotonic()
+        if data is not None and now - self.checked_at < RELOAD_INTERVAL:
+            return data
+
+        with self.lock:
+            if self.data is not None and now - self.checked_at < RELOAD_INTERVAL:
+                return self.data
+
+            try:
+                self.reload()
+            except Exception:
+                if self.data is None:
+                    raise
+                logger.exception("Reference data reload failed; keeping version %s.", self.data.version)
+
+            self.checked_at = now
+            return self.data
+
+    def reload(self):
+        if self.needs_compile():
+            compile_refdata(self.source_path, self.compiled_path)
+
+        stat = os.stat(self.compiled_path)
+        if self.data is None or self.data.identity != (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+            self.data = RefData(self.compiled_path)
+
+    @property
+    def version(self):
+        return self.current().version
+
+    def country_for(self, city):
+        data = self.current()
+        idx = data.city_country_index(city)
+        if idx is None:
+            return None
+        return data.country_info(idx)[0]
+
+    def is_known_city(self, city):
+        return self.current().city_country_index(city) is not None
+
+    def country_info(self, city):
+        data = self.current()
+        idx = data.city_country_index(city)
+        if idx is None:
+            idx = data.country_index(FALLBACK_COUNTRY)
+        return data.country_info(idx)
+
+store = RefDataStore()
+
+def benchmark(n_cities=50000, lookups=200000):
+    import random
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source_path = os.path.join(tmp, "refdata.json")
+        compiled_path = os.path.join(tmp, "refdata.bin")
+
+        with open(SOURCE_PATH, encoding="utf-8") as f:
+            source = json.load(f)
+
+        countries = list(source["countries"])
+        rng = random.Random(42)
+        for i in range(n_cities):
+            source["cities"][f"synthetic city {i:06d}"] = rng.choice(countries)
+
+        with open(source_path, "w", encoding="utf-8") as f:
+            json.dump(source, f)
+
+        started = time.perf_counter()
+        compile_refdata(source_path, compiled_path)
+        compile_seconds = time.perf_counter() - started
+
+        bench_store = RefDataStore(source_path, compiled_path)
+        names = list(source["cities"])
+        keys = [rng.choice(names) for _ in range(lookups)]
+        misses = [f"unknown place {i}" for i in range(lookups // 10)]
+
+        def timed(fn, items):
+            started = time.perf_counter()
+            for k in items:
+                fn(k)
+            return len(items) / (time.perf_counter() - started)
+
+        as_dict = {normalize_key(k): v for k, v in source["cities"].items()}
+
+        print(f"cities: {len(names)}, file size: {os.path.getsize(compiled_path):,} bytes")
+        print(f"compile: {compile_seconds:.3f}s")
+        print(f"mmap country_for hits:   {timed(bench_store.country_for, keys):,.0f} lookups/s")
+        print(f"mmap country_for misses: {timed(bench_store.country_for, misses):,.0f} lookups/s")
+        print(f"mmap country_info:       {timed(bench_store.country_info, keys):,.0f} lookups/s")
+        print(f"dict baseline:           {timed(lambda k: as_dict.get(normalize_key(k)), keys):,.0f} lookups/s")
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "build"
+
+    if command == "build":
+        n_countries, n_cities = compile_refdata()
+        print(f"Compiled {n_countries} countries and {n_cities} cities into {COMPILED_PATH}")
+    elif command == "bench":
+        benchmark()
+    else:
+        print("Usage: python refdata.py [build|bench]")
+        sys.exit(1)
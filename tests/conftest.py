@@ -0,0 +1,9 @@
+import tempfile
+import sys
+import os
+
+DB_DIR = tempfile.mkdtemp(prefix="travelplanner-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(DB_DIR, 'test.db')}"
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("GROQ_API_KEY", "test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,143 @@
+import types
+import io
+
+from datetime import date
+import pytest
+import main
+
+ROUTES = [
+    ("get", "/", None),
+    ("get", "/dashboard", None),
+    ("get", "/my_trips", None),
+    ("get", "/trip/1", None),
+    ("get", "/explore", None),
+    ("get", "/wishlist", None),
+    ("post", "/wishlist/add", {"destination": "Paris", "image": "img"}),
+    ("post", "/wishlist/remove", {"json": {"item_id": 1}}),
+    ("get", "/wishlist/remove/1", None),
+    ("post", "/wishlist/undo", {"json": {"destination": "Tokyo", "image": "img"}}),
+    ("get", "/wishlist/export/csv", None),
+    ("get", "/itinerary/Paris", None),
+    ("post", "/itinerary/Paris", {"start_date": "2027-03-01", "end_date": "2027-03-03", "budget": "100000"}),
+    ("post", "/save_itinerary", {"destination": "Paris", "notes": "n", "start_date": "2027-03-01", "end_date": "2027-03-03", "budget": "1"}),
+    ("get", "/create_trip", None),
+    ("post", "/create_trip", {"destination": "Rome", "start_date": "2027-04-01", "end_date": "2027-04-02", "budget": "1", "notes": ""}),
+    ("get", "/edit_trip/1", None),
+    ("post", "/edit_trip/1", {"destination": "Goa", "start_date": "2027-01-01", "end_date": "2027-01-06", "budget": "1", "notes": ""}),
+    ("post", "/delete_trip/1", None),
+    ("get", "/free-windows", None),
+    ("get", "/search-destination?city=atlantis", None),
+    ("get", "/trips/export/csv", None),
+    ("post", "/trips/import", {"file": (b"destination,start_date,end_date\nLyon,2027-05-01,2027-05-03\n", "trips.csv")}),
+    ("get", "/profile", None),
+    ("get", "/edit-profile", None),
+    ("post", "/edit-profile", {"username": "tester", "phone": ""}),
+    ("get", "/help", None),
+    ("get", "/about", None),
+    ("get", "/contact", None),
+    ("post", "/contact", {"message": "hello"}),
+    ("get", "/metrics", None),
+    ("get", "/static/styles.css", None),
+    ("get", "/login", None),
+    ("post", "/login", {"email": "tester@example.com", "password": "secret"}),
+    ("get", "/register", None),
+    ("post", "/register", {"username": "new", "email": "new@example.com", "password": "p", "confirm_password": "p"}),
+    ("get", "/logout", None),
+    ("get", "/no-such-page", None),
+]
+
+def fake_completion(**kwargs):
+    prompt = kwargs["messages"][0]["content"]
+    content = "Paris" if "location validator" in prompt else "Day 1: Walk around"
+    return types.SimpleNamespace(
+        choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content), finish_reason="stop")],
+        usage=types.SimpleNamespace(prompt_tokens=10, completion_tokens=20),
+        model=kwargs["model"]
+    )
+
+def offline(*args, **kwargs):
+    raise OSError("network disabled in tests")
+
+@pytest.fixture
+def client(monkeypatch):
+    app = main.app
+    app.config["TESTING"] = True
+
+    monkeypatch.setattr(main.client.chat.completions, "create", fake_completion)
+    monkeypatch.setattr(main.requests, "get", offline)
+    monkeypatch.setattr(main, "send_contact_email", lambda *args: None)
+    monkeypatch.setattr(main, "schedule_prefetch", lambda city: None)
+    monkeypatch.setattr(main, "rate_limiter", main.RateLimiter(main.RATE_LIMITS))
+
+    with app.app_context():
+        main.db.drop_all()
+        main.db.create_all()
+
+        user = main.User(
+            username="tester",
+            email="tester@example.com",
+            password_hash=main.generate_password_hash("secret", "pbkdf2:sha256:1000")
+        )
+        main.db.session.add(user)
+        main.db.session.flush()
+        main.db.session.add(main.Trip(
+            user_id=user.id, destination="Goa", start_date=date(2027, 1, 1),
+            end_date=date(2027, 1, 5), budget=1000, notes="", image="img"
+        ))
+        main.db.session.add(main.Wishlist(user_id=user.id, destination="Rome", image="img"))
+        main.db.session.commit()
+
+    test_client = app.test_client()
+    test_client.post("/login", data={"email": "tester@example.com", "password": "secret"})
+    return test_client
+
+def call(client, method, url, data):
+    if data and "json" in data:
+        return getattr(client, method)(url, json=data["json"])
+    if data and "file" in data:
+        body, filename = data["file"]
+        return client.post(url, data={"file": (io.BytesIO(body), filename)}, content_type="multipart/form-data")
+    return getattr(client, method)(url, data=data)
+
+@pytest.mark.parametrize("method,url,data", ROUTES, ids=[f"{m.upper()} {u}" for m, u, _ in ROUTES])
+def test_route_stays_within_query_budget(client, method, url, data):
+    response = call(client, method, url, data)
+    response.get_data()
+
+    assert response.status_code < 500
+
+def test_every_route_has_a_pinned_budget_and_is_exercised():
+    adapter = main.app.url_map.bind("localhost")
+    exercised = set()
+    for method, url, _ in ROUTES:
+        try:
+            endpoint, _ = adapter.match(url.split("?")[0], method=method.upper())
+        except Exception:
+            continue
+        exercised.add(endpoint)
+
+    endpoints = {rule.endpoint for rule in main.app.url_map.iter_rules()}
+
+    assert endpoints <= set(main.QUERY_BUDGETS)
+    assert endpoints <= exercised
+
+def test_query_budget_overrun_fails_the_request(client, monkeypatch):
+    monkeypatch.setitem(main.QUERY_BUDGETS, "dashboard", 1)
+
+    with pytest.raises(RuntimeError, match="over its budget"):
+        client.get("/dashboard")
+
+def test_unexpected_lazy_load_fails(client):
+    with main.app.test_request_context("/dashboard"):
+        main.db.session.expunge_all()
+        trip = main.db.session.get(main.Trip, 1)
+
+        with pytest.raises(RuntimeError, match="Unexpected lazy load"):
+            trip.user
+
+def test_raiseload_blocks_relationship_access(client):
+    with main.app.test_request_context("/dashboard"):
+        user = main.load_user(1)
+
+        with pytest.raises(Exception, match="lazy='raise'"):
+            user.trips
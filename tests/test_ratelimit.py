@@ -0,0 +1,120 @@
+import pytest
+import ratelimit
+from ratelimit import MemoryBackend, SQLiteBackend, RateLimiter
+
+LIMITS = {
+    "search": {"user": (2, 10), "global": (3, 10)},
+    "itinerary": {"user": (1, 100)}
+}
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend()
+    return SQLiteBackend(str(tmp_path / "ratelimit.db"))
+
+def stored(backend):
+    if isinstance(backend, MemoryBackend):
+        return sum(len(events) for events in backend.events.values())
+    return backend.connect().execute("SELECT COUNT(*) FROM rate_events").fetchone()[0]
+
+def has_events(backend, key):
+    if isinstance(backend, MemoryBackend):
+        return bool(backend.events.get(key))
+    return backend.connect().execute("SELECT 1 FROM rate_events WHERE key = ?", (key,)).fetchone() is not None
+
+def test_sliding_window_arithmetic(backend):
+    checks = [("k", 2, 10)]
+
+    assert backend.acquire(checks, 0.0, 10) == (0.0, None)
+    assert backend.acquire(checks, 1.0, 10) == (0.0, None)
+    assert backend.acquire(checks, 5.0, 10) == (5.0, "k")
+    assert backend.acquire(checks, 9.5, 10) == (0.5, "k")
+    assert backend.acquire(checks, 10.0, 10) == (0.0, None)
+    assert backend.acquire(checks, 10.5, 10) == (0.5, "k")
+    assert backend.acquire(checks, 11.0, 10) == (0.0, None)
+
+def test_rejection_consumes_no_quota(backend):
+    checks = [("user", 1, 10), ("global", 5, 10)]
+
+    assert backend.acquire(checks, 0.0, 10) == (0.0, None)
+    for now in (1.0, 2.0, 3.0):
+        assert backend.acquire(checks, now, 10)[1] == "user"
+
+    assert backend.acquire([("global", 5, 10)], 4.0, 10) == (0.0, None)
+    assert stored(backend) == 3
+
+def test_retry_after_is_rounded_up_and_at_least_one(backend, monkeypatch):
+    limiter = RateLimiter(LIMITS, backend)
+    clock = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "time", lambda: clock[0])
+
+    assert limiter.check("search", 1) == (True, 0)
+    clock[0] = 1000.8
+    assert limiter.check("search", 1) == (True, 0)
+
+    clock[0] = 1005.5
+    assert limiter.check("search", 1) == (False, 5)
+
+    clock[0] = 1009.9
+    assert limiter.check("search", 1) == (False, 1)
+
+    clock[0] = 1010.0
+    assert limiter.check("search", 1) == (True, 0)
+
+def test_user_limit_is_checked_before_global(backend, monkeypatch):
+    limiter = RateLimiter(LIMITS, backend)
+    monkeypatch.setattr(ratelimit.time, "time", lambda: 500.0)
+
+    assert limiter.check("search", 1) == (True, 0)
+    assert limiter.check("search", 1) == (True, 0)
+    assert limiter.check("search", 2) == (True, 0)
+
+    assert limiter.check("search", 1)[0] is False
+    assert limiter.check("search", 3)[0] is False
+
+    metrics = limiter.metrics_text()
+    assert 'endpoint="search",scope="user",decision="rejected"} 1' in metrics
+    assert 'endpoint="search",scope="global",decision="rejected"} 1' in metrics
+    assert 'endpoint="search",scope="all",decision="allowed"} 3' in metrics
+
+def test_limits_are_per_endpoint_and_per_user(backend, monkeypatch):
+    limiter = RateLimiter(LIMITS, backend)
+    monkeypatch.setattr(ratelimit.time, "time", lambda: 500.0)
+
+    assert limiter.check("itinerary", 1) == (True, 0)
+    assert limiter.check("itinerary", 2) == (True, 0)
+    assert limiter.check("itinerary", 1) == (False, 100)
+    assert limiter.check("search", 1) == (True, 0)
+
+def test_sweep_uses_longest_configured_window(backend, monkeypatch):
+    monkeypatch.setattr(ratelimit, "SWEEP_EVERY", 1)
+    limiter = RateLimiter(LIMITS, backend)
+    clock = [0.0]
+    monkeypatch.setattr(ratelimit.time, "time", lambda: clock[0])
+
+    assert limiter.max_window == 100
+
+    assert limiter.check("itinerary", 1) == (True, 0)
+    assert limiter.check("search", 1) == (True, 0)
+
+    clock[0] = 50.0
+    assert limiter.check("search", 2) == (True, 0)
+    assert has_events(backend, "itinerary:user:1")
+    assert limiter.check("itinerary", 1) == (False, 50)
+
+    clock[0] = 101.0
+    assert limiter.check("search", 2) == (True, 0)
+    assert not has_events(backend, "itinerary:user:1")
+    assert limiter.check("itinerary", 1) == (True, 0)
+
+def test_sweep_runs_every_n_calls(backend, monkeypatch):
+    monkeypatch.setattr(ratelimit, "SWEEP_EVERY", 3)
+    checks = [("a", 10, 10)]
+
+    backend.acquire(checks, 0.0, 10)
+    backend.acquire(checks, 1.0, 10)
+    assert stored(backend) == 2
+
+    backend.acquire([("b", 10, 10)], 20.0, 10)
+    assert stored(backend) == 1
@@ -0,0 +1,132 @@
+from datetime import date, timedelta
+import random
+import pytest
+from main import TripIntervals
+
+D = date(2027, 1, 1)
+
+def day(n):
+    return D + timedelta(days=n)
+
+def brute_force_windows(intervals, start, end, nights, limit):
+    busy = set()
+    for s, e in intervals:
+        d = s
+        while d <= e:
+            busy.add(d)
+            d += timedelta(days=1)
+
+    windows = []
+    run_start = None
+    d = start
+    while d <= end:
+        if d in busy:
+            if run_start is not None and (d - timedelta(days=1) - run_start).days >= nights:
+                windows.append((run_start, d - timedelta(days=1)))
+            run_start = None
+        elif run_start is None:
+            run_start = d
+        d += timedelta(days=1)
+
+    if run_start is not None and (end - run_start).days >= nights:
+        windows.append((run_start, end))
+    return windows[:limit]
+
+def brute_force_overlapping(intervals, start, end):
+    return [(s, e) for s, e in intervals if s <= end and e >= start]
+
+def test_empty_calendar_is_one_window():
+    assert TripIntervals().free_windows(day(0), day(10), 3, 5) == [(day(0), day(10))]
+
+def test_window_too_short_for_nights():
+    assert TripIntervals().free_windows(day(0), day(2), 3, 5) == []
+
+def test_adjacent_trips_leave_no_gap():
+    trips = TripIntervals([(day(2), day(4)), (day(5), day(8))])
+
+    assert trips.free_windows(day(0), day(20), 0, 10) == [(day(0), day(1)), (day(9), day(20))]
+
+def test_single_free_day_counts_for_zero_nights():
+    trips = TripIntervals([(day(0), day(2)), (day(4), day(6))])
+
+    assert trips.free_windows(day(0), day(6), 0, 10) == [(day(3), day(3))]
+    assert trips.free_windows(day(0), day(6), 1, 10) == []
+
+def test_trip_starting_before_from_pushes_first_window():
+    trips = TripIntervals([(day(-5), day(3)), (day(10), day(12))])
+
+    assert trips.free_windows(day(0), day(20), 2, 10) == [(day(4), day(9)), (day(13), day(20))]
+
+def test_trip_covering_whole_range():
+    trips = TripIntervals([(day(-5), day(30))])
+
+    assert trips.free_windows(day(0), day(20), 0, 10) == []
+
+def test_limit_caps_results():
+    trips = TripIntervals([(day(n), day(n)) for n in range(0, 40, 4)])
+
+    assert len(trips.free_windows(day(0), day(40), 1, 3)) == 3
+
+def test_horizon_ending_at_date_max():
+    start = date.max - timedelta(days=10)
+
+    assert TripIntervals().free_windows(start, date.max, 3, 5) == [(start, date.max)]
+
+    trips = TripIntervals([(start + timedelta(days=2), date.max)])
+    assert trips.free_windows(start, date.max, 1, 5) == [(start, start + timedelta(days=1))]
+
+    trips = TripIntervals([(start + timedelta(days=2), start + timedelta(days=4))])
+    assert trips.free_windows(start, date.max, 3, 5) == [(start + timedelta(days=5), date.max)]
+
+def test_nested_trip_does_not_hide_enclosing_trip():
+    trips = TripIntervals([(day(0), day(10)), (day(2), day(3))])
+
+    assert trips.free_windows(day(5), day(20), 0, 10) == [(day(11), day(20))]
+    assert trips.overlapping(day(6), day(7)) == (day(0), day(10))
+
+def test_overlapping_boundaries():
+    trips = TripIntervals([(day(5), day(8))])
+
+    assert trips.overlapping(day(0), day(4)) is None
+    assert trips.overlapping(day(9), day(12)) is None
+    assert trips.overlapping(day(0), day(5)) == (day(5), day(8))
+    assert trips.overlapping(day(8), day(12)) == (day(5), day(8))
+    assert trips.overlapping(day(6), day(6)) == (day(5), day(8))
+
+def test_add_and_remove_keep_lookups_consistent():
+    trips = TripIntervals([(day(0), day(2))])
+    trips.add(day(5), day(6))
+
+    assert trips.overlapping(day(6), day(9)) == (day(5), day(6))
+
+    trips.remove(day(5), day(6))
+    assert trips.overlapping(day(6), day(9)) is None
+    assert len(trips) == 1
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matches_brute_force(seed):
+    rng = random.Random(seed)
+    intervals = []
+    for _ in range(rng.randint(0, 8)):
+        s = day(rng.randint(-10, 40))
+        intervals.append((s, s + timedelta(days=rng.randint(0, 6))))
+
+    trips = TripIntervals(intervals[:len(intervals) // 2])
+    for s, e in intervals[len(intervals) // 2:]:
+        trips.add(s, e)
+
+    start = day(rng.randint(-5, 10))
+    end = start + timedelta(days=rng.randint(0, 40))
+    nights = rng.randint(0, 5)
+    limit = rng.randint(1, 6)
+
+    assert trips.free_windows(start, end, nights, limit) == brute_force_windows(intervals, start, end, nights, limit)
+
+    q_start = day(rng.randint(-10, 40))
+    q_end = q_start + timedelta(days=rng.randint(0, 6))
+    clash = trips.overlapping(q_start, q_end)
+    expected = brute_force_overlapping(intervals, q_start, q_end)
+    if expected:
+        assert clash in expected
+    else:
+        assert clash is None